@@ -5,12 +5,21 @@ from __future__ import annotations
 import tempfile
 import unittest
 from pathlib import Path
+from unittest import mock
+from urllib.parse import parse_qs, urlsplit
 
 import pandas as pd
 import yaml
 
 from trakt_to_letterboxd.config import Config
-from trakt_to_letterboxd.export import merge_ratings_and_watched
+from trakt_to_letterboxd import export
+from trakt_to_letterboxd.export import (
+    compare_and_get_new_entries,
+    get_all_watched,
+    get_watches_since_last_run,
+    merge_ratings_and_watched,
+    save_merged_snapshot,
+)
 
 
 class ConfigTests(unittest.TestCase):
@@ -100,6 +109,274 @@ class ExportMergeTests(unittest.TestCase):
         self.assertEqual(merged.iloc[0]["Rating10"], 8)
         self.assertFalse(bool(merged.iloc[0]["Rewatch"]))
 
+    def test_merge_uses_each_rating_once(self) -> None:
+        ratings = pd.DataFrame(
+            [
+                {
+                    "Title": "Film",
+                    "Year": 2020,
+                    "imdbID": "tt1",
+                    "Rating10": 6,
+                    "RatingDate": pd.Timestamp("2020-03-01").date(),
+                }
+            ]
+        )
+        watches = pd.DataFrame(
+            [
+                {
+                    "Title": "Film",
+                    "Year": 2020,
+                    "imdbID": "tt1",
+                    "WatchedDate": pd.Timestamp(day).date(),
+                }
+                for day in ("2020-03-01", "2020-01-01")
+            ]
+        )
+        merged = merge_ratings_and_watched(ratings, watches)
+        self.assertEqual(len(merged), 2)
+        first, rewatch = merged.iloc[1], merged.iloc[0]
+        self.assertEqual(first["Rating10"], 6)
+        self.assertFalse(bool(first["Rewatch"]))
+        self.assertEqual(rewatch["Rating10"], "")
+        self.assertTrue(bool(rewatch["Rewatch"]))
+
+
+class ExportCompareTests(unittest.TestCase):
+    def setUp(self) -> None:
+        self.merged = pd.DataFrame(
+            {
+                "Title": ["Film", "Other"],
+                "Year": [2020, 2021],
+                "Rating10": [8, ""],
+                "Rewatch": [False, False],
+                "imdbID": ["tt1", "tt2"],
+                "WatchedDate": pd.to_datetime(["2020-01-11", "2021-05-02"]),
+            }
+        )
+
+    def _compare_in(self, tmp: str) -> pd.DataFrame:
+        with mock.patch.object(export, "get_output_path", side_effect=lambda name: Path(tmp) / name):
+            return compare_and_get_new_entries(self.merged)
+
+    def test_rows_from_previous_snapshot_are_not_new(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.object(export, "get_output_path", side_effect=lambda name: Path(tmp) / name):
+                save_merged_snapshot(self.merged.iloc[:1])
+            self.assertFalse((Path(tmp) / "merged.csv").exists())
+            new_entries = self._compare_in(tmp)
+        self.assertEqual(list(new_entries["imdbID"]), ["tt2"])
+
+    def test_legacy_merged_csv_is_still_read(self) -> None:
+        with tempfile.TemporaryDirectory() as tmp:
+            self.merged.iloc[1:].to_csv(Path(tmp) / "merged.csv", index=False)
+            new_entries = self._compare_in(tmp)
+        self.assertEqual(list(new_entries["imdbID"]), ["tt1"])
+
+
+class FakeHistoryApi:
+    """Serves three pages of history, optionally without pagination headers."""
+
+    def __init__(self, *, with_headers: bool = True) -> None:
+        self.with_headers = with_headers
+        self.urls: list[str] = []
+
+    def get(self, url: str, include_headers: bool = False):
+        self.urls.append(url)
+        page = int(url.split("page=")[1].split("&")[0])
+        body = []
+        if page <= 3:
+            body = [
+                {
+                    "movie": {"title": f"Page {page}", "year": 2020, "ids": {"imdb": f"tt{page}"}},
+                    "watched_at": f"2020-01-0{page}T12:00:00.000Z",
+                }
+            ]
+        headers = {"X-Pagination-Page-Count": "3"} if self.with_headers else {}
+        return (body, headers) if include_headers else body
+
+
+class ExportHistoryFetchTests(unittest.TestCase):
+    def _fetch(self, api: FakeHistoryApi, start_at: pd.Timestamp | None = None) -> pd.DataFrame:
+        with mock.patch.object(export.core, "api", return_value=api):
+            return get_all_watched(start_at=start_at)
+
+    def test_pages_are_combined_in_page_order(self) -> None:
+        api = FakeHistoryApi()
+        watches = self._fetch(api, start_at=pd.Timestamp("2020-01-01"))
+        self.assertEqual(list(watches["Title"]), ["Page 1", "Page 2", "Page 3"])
+        self.assertEqual(len(api.urls), 3)
+        self.assertTrue(all("&start_at=2020-01-01T00:00:00Z" in url for url in api.urls))
+
+    def test_missing_page_count_walks_until_empty_page(self) -> None:
+        api = FakeHistoryApi(with_headers=False)
+        watches = self._fetch(api)
+        self.assertEqual(list(watches["Title"]), ["Page 1", "Page 2", "Page 3"])
+        self.assertIn("page=4&", api.urls[-1])
+        self.assertFalse(any("start_at" in url for url in api.urls))
+
+
+class ExportIncrementalTests(unittest.TestCase):
+    def _sync(self, previous: pd.DataFrame, item_count: int | None, **fetch) -> tuple[pd.DataFrame, mock.Mock]:
+        with tempfile.TemporaryDirectory() as tmp:
+            watched_path = Path(tmp) / "watched.csv"
+            previous.to_csv(watched_path, index=False)
+            with (
+                mock.patch.object(export, "get_output_path", return_value=watched_path),
+                mock.patch.object(export, "get_all_watched", **fetch) as fetch_mock,
+                mock.patch.object(export, "get_history_item_count", return_value=item_count),
+            ):
+                return get_watches_since_last_run(), fetch_mock
+
+    def test_cutoff_day_is_replaced_by_fetched_history(self) -> None:
+        previous = pd.DataFrame(
+            {
+                "Title": ["Old", "Cutoff"],
+                "Year": [2019, 2020],
+                "imdbID": ["tt1", "tt2"],
+                "WatchedDate": ["2020-01-01", "2020-02-01"],
+            }
+        )
+        recent = pd.DataFrame(
+            {
+                "Title": ["Cutoff", "New"],
+                "Year": [2020, 2021],
+                "imdbID": ["tt2", "tt3"],
+                "WatchedDate": pd.to_datetime(["2020-02-01", "2020-02-03"]),
+            }
+        )
+        watches, fetch = self._sync(previous, 3, return_value=recent)
+
+        fetch.assert_called_once_with(start_at=pd.Timestamp("2020-02-01"))
+        self.assertEqual(list(watches["imdbID"]), ["tt1", "tt2", "tt3"])
+
+    def test_blank_year_and_imdb_id_read_back_as_missing(self) -> None:
+        previous = pd.DataFrame(
+            {
+                "Title": ["NA", "Film"],
+                "Year": [None, 2020],
+                "imdbID": [None, "tt1"],
+                "WatchedDate": ["2020-01-01", "2021-01-01"],
+            }
+        )
+        recent = pd.DataFrame(
+            {
+                "Title": ["Film"],
+                "Year": pd.array([2020], dtype="Int64"),
+                "imdbID": ["tt1"],
+                "WatchedDate": pd.to_datetime(["2021-01-01"]),
+            }
+        )
+        watches, _ = self._sync(previous, 2, return_value=recent)
+
+        self.assertEqual(list(watches["Title"]), ["NA", "Film"])
+        self.assertEqual(str(watches["Year"].dtype), "Int64")
+        self.assertTrue(watches[["Year", "imdbID"]].iloc[0].isna().all())
+        self.assertEqual(list(merge_ratings_and_watched(pd.DataFrame(), watches)["imdbID"]), ["tt1"])
+
+    def test_backdated_watch_triggers_full_fetch(self) -> None:
+        previous = pd.DataFrame(
+            {
+                "Title": ["Film"],
+                "Year": [2020],
+                "imdbID": ["tt1"],
+                "WatchedDate": ["2021-01-01"],
+            }
+        )
+        full = pd.DataFrame(
+            {
+                "Title": ["Backdated", "Film"],
+                "Year": [2019, 2020],
+                "imdbID": ["tt9", "tt1"],
+                "WatchedDate": pd.to_datetime(["2020-06-01", "2021-01-01"]),
+            }
+        )
+
+        def fetch_history(start_at=None):
+            return full if start_at is None else full[full["WatchedDate"] >= start_at]
+
+        watches, fetch = self._sync(previous, len(full), side_effect=fetch_history)
+
+        self.assertEqual(fetch.call_args_list[-1], mock.call())
+        self.assertIn("tt9", list(watches["imdbID"]))
+
+    def test_missing_item_count_fetches_full_history_once(self) -> None:
+        previous = pd.DataFrame(
+            {
+                "Title": ["Film"],
+                "Year": [2020],
+                "imdbID": ["tt1"],
+                "WatchedDate": ["2021-01-01"],
+            }
+        )
+        with mock.patch.object(export, "log_nav") as log:
+            _, fetch = self._sync(previous, None, return_value=previous)
+
+        fetch.assert_called_once_with()
+        self.assertIn("did not report", log.call_args.args[0])
+
+
+class FakeTraktHistory:
+    """Serves a fixed watch history, honouring page, limit and start_at like Trakt."""
+
+    def __init__(self, history: list[dict]) -> None:
+        self.history = history
+
+    def get(self, url: str, include_headers: bool = False):
+        query = {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+        page, limit = int(query["page"]), int(query["limit"])
+        items = [item for item in self.history if item["watched_at"] >= query.get("start_at", "")]
+        body = items[(page - 1) * limit : page * limit]
+        headers = {
+            "X-Pagination-Page-Count": str(max(1, -(-len(items) // limit))),
+            "X-Pagination-Item-Count": str(len(items)),
+        }
+        return (body, headers) if include_headers else body
+
+
+class ExportRunTests(unittest.TestCase):
+    def _export_in(self, tmp: str, history: list[dict]) -> None:
+        user = mock.Mock()
+        user.return_value.get_ratings.return_value = []
+        with (
+            mock.patch.object(export, "get_output_path", side_effect=lambda name: Path(tmp) / name),
+            mock.patch.object(export.core, "api", return_value=FakeTraktHistory(history)),
+            mock.patch.object(export, "User", user),
+        ):
+            export.export_all_trakt_data()
+
+    def test_watch_without_year_survives_incremental_runs(self) -> None:
+        history = [
+            {"movie": {"title": "Short", "year": None, "ids": {"imdb": "tt1"}}, "watched_at": "2020-01-01T12:00:00.000Z"},
+            {"movie": {"title": "Film", "year": 2020, "ids": {"imdb": "tt2"}}, "watched_at": "2020-02-01T12:00:00.000Z"},
+        ]
+        with tempfile.TemporaryDirectory() as tmp:
+            self._export_in(tmp, history)
+            self._export_in(tmp, history)
+            merged = pd.read_parquet(Path(tmp) / "merged.parquet")
+            watched_years = (Path(tmp) / "watched.csv").read_text().splitlines()
+
+        self.assertEqual(merged.set_index("imdbID")["Year"].fillna(0).to_dict(), {"tt1": 0, "tt2": 2020})
+        self.assertEqual(watched_years[1:], ["Short,,tt1,2020-01-01", "Film,2020,tt2,2020-02-01"])
+
+    def test_incremental_run_merges_like_a_full_fetch(self) -> None:
+        history = [
+            {"movie": {"title": "NA", "year": 2019, "ids": {"imdb": "tt1"}}, "watched_at": "2020-01-01T12:00:00.000Z"},
+            {"movie": {"title": "No id", "year": 2019, "ids": {"imdb": None}}, "watched_at": "2020-01-02T12:00:00.000Z"},
+            {"movie": {"title": "No ids", "year": 2019}, "watched_at": "2020-01-03T12:00:00.000Z"},
+            {"movie": {"title": "Film", "year": 2020, "ids": {"imdb": "tt2"}}, "watched_at": "2020-02-01T12:00:00.000Z"},
+        ]
+        with tempfile.TemporaryDirectory() as full_tmp, tempfile.TemporaryDirectory() as incremental_tmp:
+            self._export_in(full_tmp, history)
+            self._export_in(incremental_tmp, history[:3])
+            self._export_in(incremental_tmp, history)
+            full = pd.read_parquet(Path(full_tmp) / "merged.parquet")
+            incremental = pd.read_parquet(Path(incremental_tmp) / "merged.parquet")
+            export_rows = len(pd.read_csv(Path(incremental_tmp) / "export.csv"))
+
+        pd.testing.assert_frame_equal(incremental, full)
+        self.assertEqual(sorted(full["Title"]), ["Film", "NA"])
+        self.assertEqual(export_rows, 2)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -12,7 +12,6 @@ from pathlib import Path
 import yaml
 
 from .config import PrettyDumper
-from .main import sync_from_trakt, upload_to_letterboxd_cli
 from .paths import config_path, data_dir
 
 
@@ -178,6 +177,9 @@ def main() -> None:
         if args.command == "init":
             sys.exit(init_config(Path(args.config), non_interactive=args.non_interactive))
 
+        # Imported here so `--help`, `--version` and `init` skip pandas, trakt and selenium.
+        from .main import sync_from_trakt, upload_to_letterboxd_cli
+
         ok = True
         if args.command in ("trakt", "sync"):
             ok = sync_from_trakt(
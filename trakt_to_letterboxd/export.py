@@ -1,5 +1,7 @@
-import datetime
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+
+import numpy as np
 import pandas as pd
 
 from trakt import core
@@ -10,9 +12,19 @@ from .log import log_nav
 from .paths import csv_path
 
 
-def convert_trakt_datetime_str(rated_at: str) -> datetime.datetime:
-    """Convert Trakt datetime string to datetime object"""
-    return datetime.datetime.strptime(rated_at, "%Y-%m-%dT%H:%M:%S.%fZ")
+TRAKT_DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S.%fZ"
+
+CSV_DATE_FORMAT = "%Y-%m-%d"
+CSV_CHUNK_SIZE = 50_000
+
+HISTORY_PAGE_LIMIT = 100
+# Trakt allows ~1000 GET requests per 5 minutes; a small pool stays well below that.
+HISTORY_FETCH_WORKERS = 8
+
+
+def parse_trakt_dates(values: pd.Series) -> pd.Series:
+    """Convert a column of Trakt datetime strings to midnight datetime64 values; unparsable values become NaT."""
+    return pd.to_datetime(values, format=TRAKT_DATETIME_FORMAT, cache=True, errors="coerce").dt.normalize()
 
 
 def get_output_path(filename: str) -> Path:
@@ -20,47 +32,69 @@ def get_output_path(filename: str) -> Path:
     return csv_path(filename)
 
 
+def write_csv(df: pd.DataFrame, path: Path) -> None:
+    """Write a frame as CSV, formatting datetime64 columns in C rather than per row."""
+    df.to_csv(
+        path,
+        index=False,
+        encoding="utf-8",
+        date_format=CSV_DATE_FORMAT,
+        chunksize=CSV_CHUNK_SIZE,
+    )
+
+
 def get_all_ratings() -> pd.DataFrame:
     """Fetch all ratings from Trakt."""
     trakt_user = User("me")
     ratings = trakt_user.get_ratings("movies")
-    ratings_data = []
+    titles, years, imdb_ids, rating_values, rated_at = [], [], [], [], []
 
     for rating_data in ratings:
         movie_info = rating_data.get("movie", rating_data)
-        rated_at = rating_data.get("rated_at", "")
-        rating_date = None
-        if rated_at:
-            try:
-                rating_date = convert_trakt_datetime_str(rated_at).date()
-            except Exception:
-                pass
-
-        ratings_data.append(
-            {
-                "Title": movie_info.get("title", "Unknown Title"),
-                "Year": movie_info.get("year", 0),
-                "imdbID": movie_info.get("ids", {}).get("imdb", ""),
-                "Rating10": rating_data.get("rating", ""),
-                "RatingDate": rating_date,
-            }
-        )
+        titles.append(movie_info.get("title", "Unknown Title"))
+        years.append(movie_info.get("year", 0))
+        imdb_ids.append(movie_info.get("ids", {}).get("imdb") or None)
+        rating_values.append(rating_data.get("rating", ""))
+        rated_at.append(rating_data.get("rated_at", ""))
 
-    return pd.DataFrame(ratings_data)
+    return pd.DataFrame(
+        {
+            "Title": titles,
+            "Year": pd.array(years, dtype="Int64"),
+            "imdbID": imdb_ids,
+            "Rating10": rating_values,
+            "RatingDate": parse_trakt_dates(pd.Series(rated_at, dtype=object)),
+        }
+    )
 
 
-def get_all_watched() -> pd.DataFrame:
-    """Fetch all watched movies from Trakt with watch history dates."""
+def _history_page_url(page: int, start_at: pd.Timestamp | None = None) -> str:
+    url = f"users/me/history/movies?page={page}&limit={HISTORY_PAGE_LIMIT}"
+    if start_at is not None:
+        url += f"&start_at={start_at:%Y-%m-%dT%H:%M:%SZ}"
+    return url
+
+
+def get_all_watched(start_at: pd.Timestamp | None = None) -> pd.DataFrame:
+    """Fetch watched movies from Trakt with watch history dates, optionally only from start_at on."""
     try:
         api = core.api()
-        history_data = []
-        page = 1
-        while True:
-            page_data = api.get(f"users/me/history/movies?page={page}&limit=100")
-            if len(page_data) == 0:
-                break
-            history_data.extend(page_data)
-            page += 1
+        page_data, headers = api.get(_history_page_url(1, start_at), include_headers=True)
+        history_data = list(page_data or [])
+        page_count = headers.get("X-Pagination-Page-Count")
+
+        if page_count is None:
+            # No pagination header: walk pages one by one until Trakt returns an empty page.
+            page = 2
+            while page_data:
+                page_data = api.get(_history_page_url(page, start_at))
+                history_data.extend(page_data or [])
+                page += 1
+        elif int(page_count) > 1:
+            page_urls = [_history_page_url(page, start_at) for page in range(2, int(page_count) + 1)]
+            with ThreadPoolExecutor(max_workers=min(HISTORY_FETCH_WORKERS, len(page_urls))) as executor:
+                for page_data in executor.map(api.get, page_urls):
+                    history_data.extend(page_data or [])
 
         if not history_data:
             return pd.DataFrame(columns=["Title", "Year", "imdbID", "WatchedDate"])
@@ -69,118 +103,233 @@ def get_all_watched() -> pd.DataFrame:
         console.print(f"Failed to fetch watch history: {e}", style="red")
         raise
 
-    watched_data = [
+    titles, years, imdb_ids, watched_at = [], [], [], []
+    for entry in history_data:
+        movie = entry.get("movie", {})
+        titles.append(movie.get("title", "Unknown Title"))
+        years.append(movie.get("year", 0))
+        # A missing or null id is None, as it is after a watched.csv round trip.
+        imdb_ids.append(movie.get("ids", {}).get("imdb") or None)
+        watched_at.append(entry.get("watched_at", ""))
+
+    return pd.DataFrame(
         {
-            "Title": entry.get("movie", {}).get("title", "Unknown Title"),
-            "Year": entry.get("movie", {}).get("year", 0),
-            "imdbID": entry.get("movie", {}).get("ids", {}).get("imdb", ""),
-            "WatchedDate": (
-                convert_trakt_datetime_str(entry.get("watched_at", "")).date()
-                if entry.get("watched_at", "")
-                else None
-            ),
+            "Title": titles,
+            "Year": pd.array(years, dtype="Int64"),
+            "imdbID": imdb_ids,
+            "WatchedDate": parse_trakt_dates(pd.Series(watched_at, dtype=object)),
         }
-        for entry in history_data
-    ]
-    return pd.DataFrame(watched_data)
+    )
+
+
+def load_previous_watches() -> pd.DataFrame | None:
+    """Load the watch history saved by the previous run, or None if unavailable."""
+    watched_path = get_output_path("watched.csv")
+    if not watched_path.exists():
+        return None
+
+    try:
+        # Titles like "NA" must round-trip as strings; only blank ids, years and dates are missing.
+        previous_df = pd.read_csv(
+            watched_path,
+            dtype={"imdbID": str, "Year": "Int64"},
+            keep_default_na=False,
+            na_values={"imdbID": [""], "Year": [""], "WatchedDate": [""]},
+        )
+        previous_df["WatchedDate"] = pd.to_datetime(previous_df["WatchedDate"], errors="coerce")
+        return previous_df
+    except Exception as e:
+        console.print(f"Could not read watched.csv: {e}", style="yellow")
+        return None
+
+
+def get_history_item_count() -> int | None:
+    """Return how many movie watches Trakt holds in total, or None if it does not say."""
+    _, headers = core.api().get("users/me/history/movies?page=1&limit=1", include_headers=True)
+    item_count = headers.get("X-Pagination-Item-Count")
+    return int(item_count) if item_count else None
+
+
+def get_watches_since_last_run() -> pd.DataFrame:
+    """Fetch history from the last saved watch day onward and combine it with watched.csv.
+
+    Saved watches only keep their date, so the whole cutoff day is fetched again and
+    the saved rows from that day are replaced rather than deduplicated. Watches added
+    with a past date (or removed) change history before the cutoff, so the combined
+    count is checked against Trakt's total and the full history is fetched on mismatch
+    or when Trakt does not report a total.
+    """
+    previous_df = load_previous_watches()
+    if previous_df is None or previous_df["WatchedDate"].isna().all():
+        return get_all_watched()
+
+    item_count = get_history_item_count()
+    if item_count is None:
+        log_nav("Trakt did not report its history size — fetching it in full…")
+        return get_all_watched()
+
+    cutoff = previous_df["WatchedDate"].max()
+    recent_df = get_all_watched(start_at=cutoff)
+    kept_df = previous_df[~(previous_df["WatchedDate"] >= cutoff)]
+    frames = [df for df in (kept_df, recent_df) if not df.empty]
+    combined_df = pd.concat(frames, ignore_index=True) if frames else recent_df
+
+    if item_count != len(combined_df):
+        log_nav("Trakt history changed before the last saved watch — fetching it in full…")
+        return get_all_watched()
+    return combined_df
+
+
+def _run_starts(keys: np.ndarray) -> np.ndarray:
+    """Mark the first row of each run of equal keys in an already sorted array."""
+    starts = np.ones(len(keys), dtype=bool)
+    starts[1:] = keys[1:] != keys[:-1]
+    return starts
 
 
 def merge_ratings_and_watched(ratings_df: pd.DataFrame, watches_df: pd.DataFrame) -> pd.DataFrame:
-    """Merge ratings and watched data by matching each watch with the closest rating."""
+    """Merge ratings and watched data by matching each watch with the closest rating.
+
+    Watches are visited oldest first and each rating is used at most once. Every
+    round pairs the oldest unmatched watch of each movie with its nearest remaining
+    rating through a single ``merge_asof``, so the number of rounds is bounded by
+    the most ratings any one movie has rather than by the number of watches.
+    """
     columns = ["Title", "Year", "Rating10", "Rewatch", "imdbID", "WatchedDate"]
     if watches_df.empty:
         return pd.DataFrame(columns=columns)
 
-    merged_rows = []
-    watches_by_movie = watches_df.groupby("imdbID")
-    ratings_by_movie = ratings_df.groupby("imdbID") if not ratings_df.empty else None
-
-    for imdb_id, watch_group in watches_by_movie:
-        watches = watch_group.sort_values("WatchedDate").reset_index(drop=True)
-
-        if ratings_by_movie is not None and imdb_id in ratings_by_movie.groups:
-            ratings = ratings_by_movie.get_group(imdb_id).sort_values("RatingDate").reset_index(drop=True)
-            available_ratings = list(ratings.index)
-        else:
-            ratings = pd.DataFrame()
-            available_ratings = []
-
-        for _, watch in watches.iterrows():
-            watch_date = watch["WatchedDate"]
-            rating_value = ""
-
-            if available_ratings and pd.notna(watch_date):
-                best_rating_idx = None
-                min_diff = None
-
-                for rating_idx in available_ratings:
-                    rating_date = ratings.loc[rating_idx, "RatingDate"]
-                    if pd.notna(rating_date):
-                        diff = abs((watch_date - rating_date).days)
-                        if min_diff is None or diff < min_diff:
-                            min_diff = diff
-                            best_rating_idx = rating_idx
-
-                if best_rating_idx is not None:
-                    rating_value = ratings.loc[best_rating_idx, "Rating10"]
-                    available_ratings.remove(best_rating_idx)
-
-            merged_rows.append(
+    # Categorical imdbIDs sort and factorize on integer codes instead of comparing strings.
+    merged_df = (
+        watches_df.dropna(subset=["imdbID"])
+        .astype({"imdbID": "category"})
+        .sort_values(["imdbID", "WatchedDate"], kind="stable", na_position="last")
+        .reset_index(drop=True)
+    )
+    if merged_df.empty:
+        return pd.DataFrame(columns=columns)
+
+    # Match on integer movie codes; ratings for movies never watched get -1 and drop out.
+    movie_codes, movie_ids = pd.factorize(merged_df["imdbID"])
+    rating_values = np.full(len(merged_df), "", dtype=object)
+    pending = pd.DataFrame(
+        {
+            "row": np.arange(len(merged_df)),
+            "movie": movie_codes,
+            "date": pd.to_datetime(merged_df["WatchedDate"]),
+        }
+    ).dropna(subset=["date"])
+
+    if ratings_df.empty:
+        available = pd.DataFrame()
+        rating_pool = np.empty(0, dtype=object)
+    else:
+        available = (
+            pd.DataFrame(
                 {
-                    "Title": watch["Title"],
-                    "Year": watch["Year"],
-                    "imdbID": imdb_id,
-                    "WatchedDate": watch_date,
-                    "Rating10": rating_value,
+                    "movie": movie_ids.get_indexer(ratings_df["imdbID"]),
+                    "date": pd.to_datetime(ratings_df["RatingDate"]),
+                    "rating": np.arange(len(ratings_df)),
                 }
             )
-
-    if not merged_rows:
-        return pd.DataFrame(columns=columns)
-
-    merged_df = pd.DataFrame(merged_rows)
-    merged_df = merged_df.sort_values(["imdbID", "WatchedDate"])
-    merged_df["Rewatch"] = merged_df.groupby("imdbID").cumcount() > 0
+            .query("movie >= 0")
+            .dropna(subset=["date"])
+            .sort_values("date", kind="stable")
+        )
+        rating_pool = ratings_df["Rating10"].to_numpy()
+
+    # Matched watches and used ratings are tracked by position, not by label lookups.
+    watch_matched = np.zeros(len(merged_df), dtype=bool)
+    rating_used = np.zeros(len(rating_pool), dtype=bool)
+
+    while not available.empty:
+        has_rating = np.zeros(len(movie_ids), dtype=bool)
+        has_rating[available["movie"].to_numpy()] = True
+        pending = pending[has_rating[pending["movie"].to_numpy()]]
+        if pending.empty:
+            break
+
+        oldest = pending[_run_starts(pending["movie"].to_numpy())].sort_values("date", kind="stable")
+        # Same-day duplicates are exposed one round at a time so the first one wins.
+        candidates = available.drop_duplicates(["movie", "date"])
+        matches = pd.merge_asof(oldest, candidates, on="date", by="movie", direction="nearest")
+
+        matched_rows = matches["row"].to_numpy()
+        matched_ratings = matches["rating"].to_numpy()
+        rating_values[matched_rows] = rating_pool[matched_ratings]
+        watch_matched[matched_rows] = True
+        rating_used[matched_ratings] = True
+        pending = pending[~watch_matched[pending["row"].to_numpy()]]
+        available = available[~rating_used[available["rating"].to_numpy()]]
+
+    merged_df["Rating10"] = rating_values
+    merged_df["imdbID"] = merged_df["imdbID"].astype(object)
+    # Rows are sorted by (imdbID, WatchedDate): only the first watch of each movie is not a rewatch.
+    merged_df["Rewatch"] = ~_run_starts(movie_codes)
     final_df = merged_df[columns].copy()
     return final_df.sort_values("WatchedDate", ascending=False, na_position="last")
 
 
-def _entry_key(df: pd.DataFrame) -> pd.Series:
-    return (
-        df["imdbID"].astype(str)
-        + "_"
-        + df["WatchedDate"].astype(str)
-        + "_"
-        + df["Rating10"].fillna("").astype(str)
+ENTRY_KEY_COLUMNS = ["imdbID", "WatchedDate", "Rating10"]
+
+
+def _entry_index(df: pd.DataFrame) -> pd.MultiIndex:
+    """Typed (imdbID, WatchedDate, Rating10) keys so CSV-loaded and in-memory rows compare equal."""
+    return pd.MultiIndex.from_arrays(
+        [
+            df["imdbID"].fillna(""),
+            pd.to_datetime(df["WatchedDate"], errors="coerce"),
+            pd.to_numeric(df["Rating10"], errors="coerce"),
+        ]
     )
 
 
-def compare_and_get_new_entries(new_merged_df: pd.DataFrame) -> pd.DataFrame:
-    """Return entries in new_merged_df that are not in the previous merged.csv."""
-    old_merged_path = get_output_path("merged.csv")
+def save_merged_snapshot(merged_df: pd.DataFrame) -> None:
+    """Persist the merged history as Parquet for the next run's comparison."""
+    snapshot_df = merged_df.assign(
+        Rating10=pd.to_numeric(merged_df["Rating10"], errors="coerce").astype("Int64")
+    )
+    snapshot_df.to_parquet(get_output_path("merged.parquet"), index=False)
+    # merged.csv from older versions is superseded and would only go stale.
+    get_output_path("merged.csv").unlink(missing_ok=True)
+
+
+def load_previous_merged() -> pd.DataFrame | None:
+    """Load the key columns of the previous merged history, or None on the first run."""
+    parquet_path = get_output_path("merged.parquet")
+    if parquet_path.exists():
+        return pd.read_parquet(parquet_path, columns=ENTRY_KEY_COLUMNS)
+
+    legacy_csv_path = get_output_path("merged.csv")
+    if legacy_csv_path.exists():
+        return pd.read_csv(
+            legacy_csv_path,
+            usecols=ENTRY_KEY_COLUMNS,
+            dtype={column: str for column in ENTRY_KEY_COLUMNS},
+            engine="c",
+        )
+    return None
 
-    if new_merged_df.empty:
-        return new_merged_df
 
-    if not old_merged_path.exists():
+def compare_and_get_new_entries(new_merged_df: pd.DataFrame) -> pd.DataFrame:
+    """Return entries in new_merged_df that are not in the previous merged history."""
+    if new_merged_df.empty:
         return new_merged_df
 
     try:
-        old_merged_df = pd.read_csv(old_merged_path, dtype={"Rating10": str})
-        if "_key" in old_merged_df.columns:
-            old_merged_df = old_merged_df.drop("_key", axis=1)
-
-        new_merged_df = new_merged_df.copy()
-        new_merged_df["_key"] = _entry_key(new_merged_df)
-        old_merged_df["_key"] = _entry_key(old_merged_df)
+        old_merged_df = load_previous_merged()
+        if old_merged_df is None:
+            return new_merged_df
 
-        new_keys = set(new_merged_df["_key"]) - set(old_merged_df["_key"])
-        new_entries_df = new_merged_df[new_merged_df["_key"].isin(new_keys)].copy()
-        return new_entries_df.drop("_key", axis=1)
+        is_new = ~_entry_index(new_merged_df).isin(_entry_index(old_merged_df))
+        return new_merged_df[is_new].copy()
 
     except Exception as e:
-        console.print(f"Could not read merged.csv: {e}", style="yellow")
-        return new_merged_df.drop("_key", axis=1) if "_key" in new_merged_df.columns else new_merged_df
+        console.print(f"Could not read previous merged history: {e}", style="yellow")
+        return new_merged_df
+
+
+EXPORT_CSV_DTYPES = {"Year": "Int64", "Rating10": str}
 
 
 def append_to_export_csv(new_entries_df: pd.DataFrame, *, dry_run: bool = False) -> tuple[pd.DataFrame, int]:
@@ -189,12 +338,12 @@ def append_to_export_csv(new_entries_df: pd.DataFrame, *, dry_run: bool = False)
 
     if new_entries_df.empty:
         if export_file.exists():
-            return pd.read_csv(export_file, dtype={"Rating10": str}), 0
+            return pd.read_csv(export_file, dtype=EXPORT_CSV_DTYPES), 0
         return new_entries_df, 0
 
     if export_file.exists():
         try:
-            existing_df = pd.read_csv(export_file, dtype={"Rating10": str})
+            existing_df = pd.read_csv(export_file, dtype=EXPORT_CSV_DTYPES, parse_dates=["WatchedDate"])
         except Exception as e:
             console.print(f"Could not read existing export.csv: {e}", style="yellow")
             existing_df = pd.DataFrame()
@@ -206,13 +355,11 @@ def append_to_export_csv(new_entries_df: pd.DataFrame, *, dry_run: bool = False)
         added = len(new_entries_df)
     else:
         combined_df = pd.concat([existing_df, new_entries_df], ignore_index=True)
-        combined_df["_key"] = _entry_key(combined_df)
-        combined_df = combined_df.drop_duplicates(subset=["_key"], keep="first")
-        combined_df = combined_df.drop("_key", axis=1)
+        combined_df = combined_df[~_entry_index(combined_df).duplicated(keep="first")]
         added = len(combined_df) - len(existing_df)
 
     if not dry_run:
-        combined_df.to_csv(export_file, index=False, encoding="utf-8")
+        write_csv(combined_df, export_file)
     return combined_df, added
 
 
@@ -223,14 +370,14 @@ def export_all_trakt_data(*, dry_run: bool = False) -> None:
     log_nav("Fetching ratings and watch history…")
 
     ratings_df = get_all_ratings()
-    watches_df = get_all_watched()
+    watches_df = get_watches_since_last_run()
     merged_df = merge_ratings_and_watched(ratings_df, watches_df)
     new_entries_df = compare_and_get_new_entries(merged_df)
 
     if not dry_run:
-        ratings_df.to_csv(get_output_path("ratings.csv"), index=False, encoding="utf-8")
-        watches_df.to_csv(get_output_path("watched.csv"), index=False, encoding="utf-8")
-        merged_df.to_csv(get_output_path("merged.csv"), index=False, encoding="utf-8")
+        write_csv(ratings_df, get_output_path("ratings.csv"))
+        write_csv(watches_df, get_output_path("watched.csv"))
+        save_merged_snapshot(merged_df)
 
     export_df, added = append_to_export_csv(new_entries_df, dry_run=dry_run)
     suffix = " (dry run)" if dry_run else ""
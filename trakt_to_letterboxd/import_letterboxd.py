@@ -1,4 +1,5 @@
 import contextlib
+import csv
 import os
 import random
 import re
@@ -42,8 +43,10 @@ def count_export_rows() -> int:
     export_path = get_csv_path("export.csv")
     if not export_path.exists():
         return 0
-    with export_path.open() as f:
-        return max(len(f.readlines()) - 1, 0)
+    with export_path.open(newline="", encoding="utf-8") as f:
+        rows = csv.reader(f)
+        next(rows, None)  # header
+        return sum(1 for row in rows if row)
 
 
 def clear_export_csv() -> None:
@@ -84,7 +87,8 @@ def dismiss_cookie_consent(driver: webdriver.Chrome) -> bool:
             return false;
         """)
         if clicked:
-            time.sleep(1)
+            with contextlib.suppress(TimeoutException):
+                WebDriverWait(driver, 5).until(lambda d: not cookie_consent_visible(d))
         return bool(clicked)
     except Exception:
         return False
@@ -163,6 +167,13 @@ def is_letterboxd_content_loaded(driver: webdriver.Chrome) -> bool:
         return False
 
 
+def wait_for_document_ready(driver: webdriver.Chrome, timeout: int = 15) -> None:
+    with contextlib.suppress(TimeoutException):
+        WebDriverWait(driver, timeout).until(
+            lambda d: d.execute_script("return document.readyState") == "complete"
+        )
+
+
 def letterboxd_access_ready(driver: webdriver.Chrome) -> bool:
     return is_letterboxd_content_loaded(driver) and not cookie_consent_visible(driver)
 
@@ -287,7 +298,6 @@ def bootstrap_sign_in_form(driver: webdriver.Chrome) -> None:
     driver.execute_script("""
         document.dispatchEvent(new CustomEvent('sign-in.formready', { bubbles: true, cancelable: false }));
     """)
-    time.sleep(2)
 
 
 def hide_ad_overlays(driver: webdriver.Chrome) -> None:
@@ -388,7 +398,7 @@ def wait_for_sign_in(
     log_nav("Navigating to https://letterboxd.com/sign-in/")
     ensure_letterboxd_window()
     driver.get("https://letterboxd.com/sign-in/")
-    time.sleep(2)
+    wait_for_document_ready(driver)
     if not wait_for_letterboxd_access(driver, timeout=timeout):
         return False
 
@@ -398,8 +408,9 @@ def wait_for_sign_in(
     try:
         WebDriverWait(driver, 15).until(
             lambda d: any(
-                d.find_elements(By.CSS_SELECTOR, sel)
+                field.is_displayed()
                 for sel in ("#field-username", "form.js-sign-in-form input[name='username']")
+                for field in d.find_elements(By.CSS_SELECTOR, sel)
             )
         )
         fill_sign_in_credentials(driver, config)
@@ -456,6 +467,21 @@ def shutdown_driver(driver: webdriver.Chrome | None) -> None:
             service.process.kill()
 
 
+# Cached drivers are keyed on the installed Chrome version, so a Chrome update still
+# fetches a matching driver; within that version skip the daily online re-check.
+WEBDRIVER_CACHE_VALID_DAYS = 30
+
+
+def webdriver_manager_driver_path() -> str:
+    """Resolve chromedriver through webdriver-manager."""
+    os.environ.setdefault("WDM_LOG", "0")
+    from webdriver_manager.chrome import ChromeDriverManager
+    from webdriver_manager.core.driver_cache import DriverCacheManager
+
+    cache_manager = DriverCacheManager(valid_range=WEBDRIVER_CACHE_VALID_DAYS)
+    return ChromeDriverManager(cache_manager=cache_manager).install()
+
+
 def setup_driver() -> webdriver.Chrome:
     options = ChromeOptions()
     options.add_argument("--disable-blink-features=AutomationControlled")
@@ -472,8 +498,7 @@ def setup_driver() -> webdriver.Chrome:
     if chromedriver_path and Path(chromedriver_path).exists():
         service = ChromeService(executable_path=chromedriver_path)
     else:
-        from webdriver_manager.chrome import ChromeDriverManager
-        service = ChromeService(ChromeDriverManager().install())
+        service = ChromeService(webdriver_manager_driver_path())
 
     driver = webdriver.Chrome(service=service, options=options)
     driver.implicitly_wait(0)
@@ -497,7 +522,7 @@ def set_diary_import_option(driver: webdriver.Chrome, enabled: bool) -> None:
     if checkbox.is_selected() == enabled:
         return
     driver.find_element(By.CSS_SELECTOR, 'label[for="add-watchedDates-from-list"]').click()
-    time.sleep(0.3)
+    WebDriverWait(driver, 5).until(lambda _: checkbox.is_selected() == enabled)
     log_nav("Diary entries from watched dates " + ("enabled" if enabled else "disabled") + ".")
 
 
@@ -565,7 +590,10 @@ def upload_csv_to_letterboxd(
         log_nav("Navigating to https://letterboxd.com/import/")
         ensure_letterboxd_window()
         driver.get("https://letterboxd.com/import/")
-        time.sleep(3)
+        WebDriverWait(driver, 10).until(
+            lambda d: "sign-in" in d.current_url
+            or d.find_elements(By.CSS_SELECTOR, "input[type='file']")
+        )
 
         if "sign-in" in driver.current_url:
             log_err("Not logged in — redirected to sign-in.")
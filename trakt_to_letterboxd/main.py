@@ -1,15 +1,10 @@
 from datetime import datetime
 from pathlib import Path
 
-from trakt.errors import TraktUnavailable
-
 from . import console
 from .config import load_config
-from .export import export_all_trakt_data
-from .import_letterboxd import upload_to_letterboxd
 from .log import configure_logging
 from .paths import config_path as default_config_file
-from .trakt import trakt_init
 
 
 def sync_from_trakt(
@@ -19,6 +14,11 @@ def sync_from_trakt(
     verbose: bool = False,
 ) -> bool:
     """Pull new watches from Trakt into export.csv. Returns True on success."""
+    from trakt.errors import TraktUnavailable
+
+    from .export import export_all_trakt_data
+    from .trakt import trakt_init
+
     configure_logging(verbose=verbose)
     title = "Trakt download (dry run)" if dry_run else "Trakt download"
     console.print(title, style="bold magenta")
@@ -63,6 +63,8 @@ def upload_to_letterboxd_cli(
     auto_sign_in: bool = True,
 ) -> bool:
     """Upload export.csv to Letterboxd. Returns True on success."""
+    from .import_letterboxd import upload_to_letterboxd
+
     path = Path(config_path) if config_path is not None else default_config_file()
     config = load_config(path)
     if not config: